@@ -2,38 +2,190 @@ import csv
 import logging
 import os
 import numpy as np
+import pyarrow.parquet as pq
 
 # Try importing the AI libraries
 try:
+    import torch
     from sentence_transformers import SentenceTransformer
-    from sklearn.metrics.pairwise import cosine_similarity
+    torch.set_num_threads(os.cpu_count() or 1)  # Use every core for CPU inference
     AI_AVAILABLE = True
+    GPU_AVAILABLE = torch.cuda.is_available()
 except ImportError:
     AI_AVAILABLE = False
+    GPU_AVAILABLE = False
+
+# Optional: ONNX Runtime backend for the same MiniLM encoder (see README for the export step)
+try:
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+# Optional: Numba JIT for the fused scoring + threshold scan on CPU
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 # --- Configuration ---
-INPUT_FILE = "cleaned_companies.csv"
+INPUT_FILE = "cleaned_companies.parquet"
 OUTPUT_FILE = "ai_duplicates.csv"
 SAMPLE_SIZE = 50  # Keep small for speed as per requirements
 SIMILARITY_THRESHOLD = 0.85 # Cutoff for considering them duplicates
+ENCODE_BATCH_SIZE = 32 # Names are length-sorted and padded per batch, not to the global max
+MAX_SEQ_LENGTH = 64 # Company names are short; avoids wasted padding tokens
+ONNX_MODEL_DIR = "onnx_minilm" # Exported + optimized all-MiniLM-L6-v2; used instead of PyTorch when present
+SCAN_BLOCK_SIZE = 1024 # Rows per block of the exact CPU scan (bounds memory at block x N floats)
+USE_NUMBA_SCAN = False # Opt-in: fused Numba kernel instead of the blocked BLAS scan (same pairs, ~6x slower per core)
+
+# Encoder cache: (model, tokenizer) loaded on first use, reused by later run() calls.
+# tokenizer is None for the SentenceTransformer backend.
+_MODEL = None
+
+def _get_model(use_onnx):
+    """Loads the MiniLM encoder once per process."""
+    global _MODEL
+    if _MODEL is None:
+        if use_onnx:
+            logging.info(f"Loading ONNX Runtime model from '{ONNX_MODEL_DIR}'...")
+            model = ORTModelForFeatureExtraction.from_pretrained(ONNX_MODEL_DIR, provider="CPUExecutionProvider")
+            _MODEL = (model, AutoTokenizer.from_pretrained(ONNX_MODEL_DIR))
+        else:
+            logging.info("Loading model 'all-MiniLM-L6-v2'...")
+            model = SentenceTransformer('all-MiniLM-L6-v2', device="cuda" if GPU_AVAILABLE else None)
+            model.max_seq_length = MAX_SEQ_LENGTH
+            _MODEL = (model, None)
+    return _MODEL
 
 def load_sample_companies(limit):
     """Loads a small sample of companies for analysis."""
     companies = []
     if os.path.exists(INPUT_FILE):
-        with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            all_rows = list(reader)
-            # Take the top N (or random N)
-            companies = all_rows[:limit]
+        table = pq.read_table(INPUT_FILE, columns=["company_id", "clean_name"])
+        # Take the top N (or random N)
+        companies = table.slice(0, limit).to_pylist()
     return companies
 
+def encode_onnx(model, tokenizer, names):
+    """
+    Encodes names with the ONNX Runtime MiniLM graph.
+    Reproduces the sentence-transformers pipeline: length-sorted batches,
+    mean pooling over the attention mask, then L2 normalization.
+    """
+    embeddings = np.empty((len(names), model.config.hidden_size), dtype=np.float32)
+    order = np.argsort([len(n) for n in names], kind="stable")
+
+    for start in range(0, len(names), ENCODE_BATCH_SIZE):
+        batch_idx = order[start:start + ENCODE_BATCH_SIZE]
+        inputs = tokenizer(
+            [names[i] for i in batch_idx],
+            padding=True,
+            truncation=True,
+            max_length=MAX_SEQ_LENGTH,
+            return_tensors="np",
+        )
+        token_embeddings = model(**inputs).last_hidden_state
+
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        embeddings[batch_idx] = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+    return embeddings
+
+if NUMBA_AVAILABLE:
+    # reassoc/contract let LLVM vectorize the dot-product reduction
+    @numba.njit(fastmath={"reassoc", "contract"}, cache=True)
+    def _pair_score(embeddings, i, j):
+        """Exact fp32 cosine score of pair (i, j) (embeddings are L2-normalized)."""
+        dot = np.float32(0.0)
+        for k in range(embeddings.shape[1]):
+            dot += embeddings[i, k] * embeddings[j, k]
+        return dot
+
+    @numba.njit(parallel=True, cache=True)
+    def _scan_pairs(embeddings, threshold):
+        """
+        Two parallel passes over the upper triangle: count the matches of each
+        row, then write them at that row's offset. Threads never share an
+        output slot, and no N x N array is allocated.
+        """
+        num = embeddings.shape[0]
+        counts = np.zeros(num, dtype=np.int64)
+        for i in numba.prange(num):
+            for j in range(i + 1, num):
+                if _pair_score(embeddings, i, j) >= threshold:
+                    counts[i] += 1
+
+        offsets = np.zeros(num + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        rows = np.empty(offsets[num], dtype=np.int64)
+        cols = np.empty(offsets[num], dtype=np.int64)
+        scores = np.empty(offsets[num], dtype=np.float32)
+        for i in numba.prange(num):
+            k = offsets[i]
+            for j in range(i + 1, num):
+                score = _pair_score(embeddings, i, j)
+                if score >= threshold:
+                    rows[k] = i
+                    cols[k] = j
+                    scores[k] = score
+                    k += 1
+        return rows, cols, scores
+
+def fused_duplicate_pairs(embeddings, threshold):
+    """
+    CPU duplicate scan compiled with Numba: exact fp32 dot product and
+    threshold fused per pair (same pairs as blocked_duplicate_pairs, without
+    materializing any block of scores). Returns (rows, cols, scores) in row-major order.
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    return _scan_pairs(embeddings, np.float32(threshold))
+
+def blocked_duplicate_pairs(embeddings, threshold):
+    """
+    Exact cosine similarity on the CPU, one block of rows at a time: each
+    block is multiplied (fp32 BLAS) against itself and every later row only,
+    then the upper triangle is thresholded. Memory stays at
+    SCAN_BLOCK_SIZE x N floats; results match gpu_duplicate_pairs.
+    Returns (rows, cols, scores) in row-major order.
+    """
+    rows, cols, scores = [], [], []
+    for start in range(0, len(embeddings), SCAN_BLOCK_SIZE):
+        block = embeddings[start:start + SCAN_BLOCK_SIZE]
+        # Columns start at 'start', so k=1 keeps exactly the pairs with col > row
+        similarity = np.triu(block @ embeddings[start:].T, k=1)
+        i, j = np.nonzero(similarity >= threshold)
+        rows.append(i + start)
+        cols.append(j + start)
+        scores.append(similarity[i, j])
+
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return np.concatenate(rows), np.concatenate(cols), np.concatenate(scores)
+
+def gpu_duplicate_pairs(embeddings, threshold, device="cuda"):
+    """
+    Exact cosine similarity on the GPU: one fp32 matmul over the normalized
+    embeddings, then the thresholded upper triangle.
+    Returns (rows, cols, scores) as numpy arrays, in row-major order.
+    """
+    emb = torch.from_numpy(np.ascontiguousarray(embeddings, dtype=np.float32)).to(device)
+    # triu zeroes the diagonal and lower triangle, which can never reach a positive threshold
+    similarity = torch.triu(emb @ emb.T, diagonal=1)
+    rows, cols = torch.nonzero(similarity >= threshold, as_tuple=True)
+    scores = similarity[rows, cols]
+    return rows.cpu().numpy(), cols.cpu().numpy(), scores.cpu().numpy()
+
 def run():
     logging.info("--- Starting Phase 6: AI Module (Duplicate Detection) ---")
 
-    if not AI_AVAILABLE:
-        logging.error("CRITICAL: 'sentence-transformers' or 'sklearn' not installed.")
-        logging.error("Please run: pip install sentence-transformers scikit-learn")
+    use_onnx = ONNX_AVAILABLE and os.path.isdir(ONNX_MODEL_DIR)
+    if not AI_AVAILABLE and not use_onnx:
+        logging.error("CRITICAL: 'sentence-transformers' not installed.")
+        logging.error("Please run: pip install sentence-transformers")
         return
 
     # 1. Load Data
@@ -48,32 +200,49 @@ def run():
     logging.info(f"Loaded {len(names)} companies for embedding analysis.")
 
     # 2. Generate Embeddings
-    logging.info("Loading model 'all-MiniLM-L6-v2'...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    
-    logging.info("Generating vector embeddings...")
-    embeddings = model.encode(names)
-
-    # 3. Calculate Similarity Matrix
-    logging.info("Calculating cosine similarity...")
-    similarity_matrix = cosine_similarity(embeddings)
-
-    # 4. Find Duplicates
-    duplicates = []
-    # Iterate through the upper triangle of the matrix to avoid self-matches and double counting
-    num_companies = len(names)
-    for i in range(num_companies):
-        for j in range(i + 1, num_companies):
-            score = similarity_matrix[i][j]
-            
-            if score >= SIMILARITY_THRESHOLD:
-                duplicates.append({
-                    "company_a_id": ids[i],
-                    "company_a_name": names[i],
-                    "company_b_id": ids[j],
-                    "company_b_name": names[j],
-                    "similarity_score": f"{score:.4f}"
-                })
+    model, tokenizer = _get_model(use_onnx)
+
+    if tokenizer is not None:
+        logging.info("Generating vector embeddings (ONNX Runtime)...")
+        embeddings = encode_onnx(model, tokenizer, names)
+    else:
+        logging.info("Generating vector embeddings...")
+        # L2-normalized at encode time, so a plain dot product is the cosine similarity.
+        # encode() sorts the inputs by length before batching ("smart batching")
+        embeddings = model.encode(
+            names,
+            batch_size=ENCODE_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+
+    if GPU_AVAILABLE:
+        # 3-4. Find Duplicates: the full N x N product is cheap on the GPU
+        logging.info("Calculating cosine similarity on GPU...")
+        rows, cols, scores = gpu_duplicate_pairs(embeddings, SIMILARITY_THRESHOLD)
+    elif USE_NUMBA_SCAN and NUMBA_AVAILABLE:
+        # 3-4. Find Duplicates: exact scoring and threshold in one compiled pass
+        logging.info("Calculating cosine similarity (Numba)...")
+        rows, cols, scores = fused_duplicate_pairs(embeddings, SIMILARITY_THRESHOLD)
+    else:
+        # 3-4. Find Duplicates: exact fp32 scan of the upper triangle
+        # (skips self-matches and double counting), one block of rows at a time
+        logging.info("Calculating cosine similarity...")
+        rows, cols, scores = blocked_duplicate_pairs(embeddings, SIMILARITY_THRESHOLD)
+
+    names = np.asarray(names, dtype=object)
+    ids = np.asarray(ids, dtype=object)
+    duplicates = [
+        {
+            "company_a_id": a_id,
+            "company_a_name": a_name,
+            "company_b_id": b_id,
+            "company_b_name": b_name,
+            "similarity_score": f"{score:.4f}"
+        }
+        for a_id, a_name, b_id, b_name, score in zip(ids[rows], names[rows], ids[cols], names[cols], scores)
+    ]
 
     # 5. Export Results
     logging.info(f"Found {len(duplicates)} potential duplicates.")
@@ -1,44 +1,35 @@
-import csv
 import logging
 import os
+import pandas as pd
 import matplotlib.pyplot as plt
-from collections import Counter
 
 # --- Configuration ---
-FILE_COMPANIES = "cleaned_companies.csv"
-FILE_LINKS = "company_facilities.csv"
+FILE_COMPANIES = "cleaned_companies.parquet"
+FILE_LINKS = "company_facilities.parquet"
 OUTPUT_DIR = "analytics_output"
 
 def load_data():
-    """Loads necessary data for analytics."""
-    companies = []
-    links = []
+    """Loads necessary data for analytics as pandas DataFrames."""
+    companies = pd.DataFrame()
+    links = pd.DataFrame()
     
     if os.path.exists(FILE_COMPANIES):
-        with open(FILE_COMPANIES, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            companies = list(reader)
+        companies = pd.read_parquet(FILE_COMPANIES, columns=["country"])
             
     if os.path.exists(FILE_LINKS):
-        with open(FILE_LINKS, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            links = list(reader)
+        links = pd.read_parquet(FILE_LINKS, columns=["company_id"])
             
     return companies, links
 
 def plot_companies_by_country(companies):
     """Generates a bar chart of companies per country."""
-    if not companies:
+    if companies.empty:
         logging.warning("No company data to plot.")
         return
 
-    # Count frequencies
-    countries = [c['country'] for c in companies if c.get('country')]
-    counts = Counter(countries)
-    
-    # Sort for better visualization
-    sorted_data = sorted(counts.items(), key=lambda x: x[1], reverse=True)
-    labels, values = zip(*sorted_data)
+    # Count frequencies, skipping empty countries (value_counts only drops NaN; sorts descending)
+    counts = companies.loc[companies['country'].ne(''), 'country'].value_counts()
+    labels, values = counts.index.to_numpy(), counts.to_numpy()
 
     plt.figure(figsize=(10, 6))
     bars = plt.bar(labels, values, color='skyblue', edgecolor='black')
@@ -63,16 +54,15 @@ def plot_companies_by_country(companies):
 
 def plot_facilities_per_company(links):
     """Generates a histogram of facilities count per company."""
-    if not links:
+    if links.empty:
         logging.warning("No link data to plot.")
         return
 
-    # Count facilities per company
-    company_counts = Counter([l['company_id'] for l in links])
-    facility_counts = list(company_counts.values())
+    # Count facilities per company (group sizes; no sorting needed for a histogram)
+    facility_counts = links.groupby('company_id', sort=False).size().to_numpy()
 
     plt.figure(figsize=(10, 6))
-    plt.hist(facility_counts, bins=range(1, max(facility_counts) + 2), 
+    plt.hist(facility_counts, bins=range(1, int(facility_counts.max()) + 2), 
              color='lightgreen', edgecolor='black', align='left')
     
     plt.title('Distribution of Facilities per Company', fontsize=14)
@@ -96,7 +86,7 @@ def run():
         
     companies, links = load_data()
     
-    if not companies or not links:
+    if companies.empty or links.empty:
         logging.error("Missing data files. Cannot generate analytics.")
         return
 
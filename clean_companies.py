@@ -1,13 +1,28 @@
-import json
-import csv
 import re
 import hashlib
+import orjson
+import io
+import zstandard as zstd
 import logging
 import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 # --- Configuration ---
-INPUT_FILE = "raw_oar_data.json"
-OUTPUT_FILE = "cleaned_companies.csv"
+INPUT_FILE = "raw_oar_data.jsonl.zst"
+OUTPUT_FILE = "cleaned_companies.parquet"
+
+# Raw fields used by the cleaning phases (everything else in the extract is ignored)
+RAW_COLUMNS = ["os_id", "name", "address", "country_name"]
+
+# Output schema (also fixes the column order of the table)
+COMPANY_SCHEMA = pa.schema([
+    ("company_id", pa.string()),
+    ("clean_name", pa.string()),
+    ("country", pa.string()),
+    ("original_name_example", pa.string()),
+])
 
 # Common legal suffixes to remove for cleaner names
 LEGAL_SUFFIXES = [
@@ -16,39 +31,83 @@ LEGAL_SUFFIXES = [
     r"\bLLC\b", r"\bLimited\b", r"\bS\.?L\.?\b"
 ]
 
-def clean_name(name):
+# All suffixes as one alternation, so each name is scanned once instead of once per suffix
+SUFFIX_RE = re.compile("|".join(LEGAL_SUFFIXES), flags=re.IGNORECASE)
+PUNCT_RE = re.compile(r"[^\w\s]") # Anything but alphanumerics and whitespace
+WS_RE = re.compile(r"\s+")
+
+def clean_name(names):
     """
-    Normalizes company names by:
+    Normalizes a pandas Series of company names by:
     1. Upper-casing
     2. Removing legal suffixes
     3. Removing punctuation and extra whitespace
+    Missing/empty names become "UNKNOWN_COMPANY".
     """
-    if not name:
-        return "UNKNOWN_COMPANY"
-    
+    # Object dtype keeps Python 're' semantics (Unicode-aware \w and \b);
+    # Arrow-backed strings would route the regexes through ASCII-only RE2.
+    names = names.astype(object)
+    missing = names.isna() | (names == "")
+
     # 1. Standardize case
-    clean = name.upper().strip()
-    
-    # 2. Remove legal suffixes (using regex)
-    for suffix in LEGAL_SUFFIXES:
-        clean = re.sub(suffix, "", clean, flags=re.IGNORECASE)
-    
+    clean = names.str.upper().str.strip()
+
+    # 2. Remove legal suffixes (single combined regex)
+    clean = clean.str.replace(SUFFIX_RE, "", regex=True)
+
     # 3. Remove punctuation (keep alphanumeric and spaces)
-    clean = re.sub(r"[^\w\s]", "", clean)
-    
+    clean = clean.str.replace(PUNCT_RE, "", regex=True)
+
     # 4. Collapse multiple spaces
-    clean = re.sub(r"\s+", " ", clean).strip()
-    
-    return clean
+    clean = clean.str.replace(WS_RE, " ", regex=True).str.strip()
+
+    return clean.mask(missing, "UNKNOWN_COMPANY")
 
 def generate_company_id(name, country):
     """
     Generates a deterministic ID based on company name and country.
-    Using MD5 is sufficient for this scope and ensures the same ID 
-    is generated every time the script runs.
+    BLAKE2b with a 6-byte digest gives the 12 hex chars directly and is
+    cheaper per call than MD5; the same ID is generated every time the
+    script runs.
     """
     unique_string = f"{name}|{country}".encode('utf-8')
-    return hashlib.md5(unique_string).hexdigest()[:12] # Shorten to 12 chars for readability
+    return hashlib.blake2b(unique_string, digest_size=6).hexdigest()
+
+def load_raw_data():
+    """Reads the Phase 1 extract into a DataFrame holding the raw fields used downstream."""
+    # zstd-compressed JSON Lines; orjson parses each line straight from bytes
+    with open(INPUT_FILE, 'rb') as raw, io.BufferedReader(zstd.ZstdDecompressor().stream_reader(raw)) as f:
+        raw_data = [orjson.loads(line) for line in f]
+    return pd.DataFrame.from_records(raw_data, columns=RAW_COLUMNS)
+
+def prepare_records(df):
+    """Adds the normalized 'country' and 'clean_name' columns to the raw records."""
+    return df.assign(
+        country=df["country_name"].fillna("Unknown").astype(object).str.strip().str.title(), # Normalize country [cite: 48]
+        clean_name=clean_name(df["name"]),
+    )
+
+def build_companies(df):
+    """
+    Builds the company table from prepared records: one row per
+    (clean_name, country), keeping the first raw name seen as an example.
+    """
+    # Deduplicate on (normalized_name, country), keeping the first raw record of each pair
+    # (one hash pass over the key columns; no groupby object is built)
+    unique_companies = df.drop_duplicates(["clean_name", "country"])
+
+    # Generate IDs (only for the deduplicated pairs)
+    return unique_companies.assign(
+        company_id=[generate_company_id(n, c) for n, c in zip(unique_companies["clean_name"], unique_companies["country"])],
+        original_name_example=unique_companies["name"], # Keep one original for reference
+    )
+
+def save_companies(companies):
+    """Writes the company table to OUTPUT_FILE."""
+    # Intermediate tables are Parquet (zstd); Phase 7 exports the CSV deliverable [cite: 50]
+    table = pa.Table.from_pandas(companies, schema=COMPANY_SCHEMA, preserve_index=False)
+    pq.write_table(table, OUTPUT_FILE, compression="zstd")
+    logging.info(f"Cleaned company table saved to {OUTPUT_FILE}")
 
 def run():
     logging.info("--- Starting Phase 2: Company Cleaning ---")
@@ -58,46 +117,13 @@ def run():
         return
 
     try:
-        with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
-        
-        logging.info(f"Loaded {len(raw_data)} raw records.")
-        
-        # Dictionary to handle deduplication: Key = (normalized_name, country)
-        unique_companies = {}
-
-        for record in raw_data:
-            raw_name = record.get("name", "")
-            country = record.get("country_name", "Unknown").strip().title() # Normalize country [cite: 48]
-            
-            cleaned_name = clean_name(raw_name)
-            
-            # Key for uniqueness
-            comp_key = (cleaned_name, country)
-            
-            if comp_key not in unique_companies:
-                # Generate ID
-                comp_id = generate_company_id(cleaned_name, country)
-                
-                unique_companies[comp_key] = {
-                    "company_id": comp_id,
-                    "clean_name": cleaned_name,
-                    "country": country,
-                    "original_name_example": raw_name # Keep one original for reference
-                }
+        df = load_raw_data()
+        logging.info(f"Loaded {len(df)} raw records.")
 
+        unique_companies = build_companies(prepare_records(df))
         logging.info(f"identified {len(unique_companies)} unique companies from raw data.")
 
-        # Save to CSV [cite: 50]
-        fieldnames = ["company_id", "clean_name", "country", "original_name_example"]
-        
-        with open(OUTPUT_FILE, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for comp in unique_companies.values():
-                writer.writerow(comp)
-                
-        logging.info(f"Cleaned company table saved to {OUTPUT_FILE}")
+        save_companies(unique_companies)
 
     except Exception as e:
         logging.error(f"Error in Phase 2: {e}")
@@ -105,4 +131,4 @@ def run():
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    run()
\ No newline at end of file
+    run()
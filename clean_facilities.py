@@ -1,14 +1,30 @@
-import json
-import csv
 import logging
 import os
 import hashlib
 import re
+import orjson
+import io
+import zstandard as zstd
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 # --- Configuration ---
-INPUT_FILE = "raw_oar_data.json"
-OUTPUT_FACILITIES = "cleaned_facilities.csv"
-OUTPUT_RELATION = "company_facilities.csv"
+INPUT_FILE = "raw_oar_data.jsonl.zst"
+OUTPUT_FACILITIES = "cleaned_facilities.parquet"
+OUTPUT_RELATION = "company_facilities.parquet"
+
+# Output schemas (also fix the column order of the tables)
+FACILITY_SCHEMA = pa.schema([
+    ("facility_id", pa.string()),
+    ("name", pa.string()),
+    ("address", pa.string()),
+    ("country", pa.string()),
+])
+RELATION_SCHEMA = pa.schema([
+    ("company_id", pa.string()),
+    ("facility_id", pa.string()),
+])
 
 # --- Reusing Logic from Phase 2 for Consistency ---
 # In a production environment, these would be in a shared 'utils.py' module.
@@ -20,24 +36,74 @@ LEGAL_SUFFIXES = [
     r"\bLLC\b", r"\bLimited\b", r"\bS\.?L\.?\b"
 ]
 
-def clean_name(name):
-    if not name: return "UNKNOWN"
-    clean = name.upper().strip()
-    for suffix in LEGAL_SUFFIXES:
-        clean = re.sub(suffix, "", clean, flags=re.IGNORECASE)
-    clean = re.sub(r"[^\w\s]", "", clean)
-    clean = re.sub(r"\s+", " ", clean).strip()
-    return clean
+SUFFIX_RE = re.compile("|".join(LEGAL_SUFFIXES), flags=re.IGNORECASE)
+PUNCT_RE = re.compile(r"[^\w\s]")
+WS_RE = re.compile(r"\s+")
+
+def clean_name(names):
+    # Object dtype keeps Python 're' semantics (Arrow strings would use ASCII-only RE2)
+    names = names.astype(object)
+    missing = names.isna() | (names == "")
+    clean = names.str.upper().str.strip().str.replace(SUFFIX_RE, "", regex=True)
+    clean = clean.str.replace(PUNCT_RE, "", regex=True)
+    clean = clean.str.replace(WS_RE, " ", regex=True).str.strip()
+    return clean.mask(missing, "UNKNOWN")
 
 def generate_company_id(name, country):
     unique_string = f"{name}|{country}".encode('utf-8')
-    return hashlib.md5(unique_string).hexdigest()[:12]
+    return hashlib.blake2b(unique_string, digest_size=6).hexdigest()
+
+def clean_text(texts):
+    """Simple text cleaner for a Series of addresses or descriptions."""
+    texts = texts.fillna("").astype(str)
+    return texts.str.replace("\n", " ", regex=False).str.replace("\r", "", regex=False).str.strip()
+
+def build_facilities(df):
+    """
+    Builds the facility and link tables from raw records.
+    Expects the raw 'os_id', 'name' and 'address' columns plus the normalized
+    'country' and the parent 'company_id' of each record.
+    Returns (facilities, company_facility_links) DataFrames.
+    """
+    raw_names = df["name"].fillna("")
+    address = clean_text(df["address"])
+
+    # Identify/Generate Facility ID
+    # Ideally use the OAR ID (os_id). If missing, generate a hash.
+    facility_id = df["os_id"].astype(object)
+    missing_id = facility_id.isna() | (facility_id == "")
+    if missing_id.any():
+        # Fallback ID generation
+        facility_id[missing_id] = [
+            "GEN-" + hashlib.md5(f"{n}|{a}|{c}".encode('utf-8')).hexdigest()[:8]
+            for n, a, c in zip(raw_names[missing_id], address[missing_id], df["country"][missing_id])
+        ]
+
+    records = pd.DataFrame({
+        "facility_id": facility_id,
+        "name": clean_text(raw_names),
+        "address": address,
+        "country": df["country"],
+        "company_id": df["company_id"],
+    })
+
+    # Drop duplicate facility entries if raw data has overlap (first occurrence wins)
+    records = records.drop_duplicates("facility_id")
 
-def clean_text(text):
-    """Simple text cleaner for addresses and descriptions."""
-    if not text:
-        return ""
-    return str(text).replace("\n", " ").replace("\r", "").strip()
+    # Facility table, and link table (Many-to-Many potential, but here it's effectively 1-to-1 or Many-to-1)
+    facilities = records[["facility_id", "name", "address", "country"]]
+    company_facility_links = records[["company_id", "facility_id"]]
+    return facilities, company_facility_links
+
+def save_facilities(facilities, company_facility_links):
+    """Writes the facility table and the company-facility link table."""
+    logging.info(f"Saving {len(facilities)} facilities...")
+    table = pa.Table.from_pandas(facilities, schema=FACILITY_SCHEMA, preserve_index=False)
+    pq.write_table(table, OUTPUT_FACILITIES, compression="zstd")
+
+    logging.info(f"Saving {len(company_facility_links)} relational links...")
+    table = pa.Table.from_pandas(company_facility_links, schema=RELATION_SCHEMA, preserve_index=False)
+    pq.write_table(table, OUTPUT_RELATION, compression="zstd")
 
 def run():
     logging.info("--- Starting Phase 3: Facility Processing ---")
@@ -47,70 +113,30 @@ def run():
         return
 
     try:
-        with open(INPUT_FILE, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
+        # zstd-compressed JSON Lines; orjson parses each line straight from bytes
+        with open(INPUT_FILE, 'rb') as raw, io.BufferedReader(zstd.ZstdDecompressor().stream_reader(raw)) as f:
+            raw_data = [orjson.loads(line) for line in f]
         
         logging.info(f"Loaded {len(raw_data)} raw records for processing.")
         
-        facilities = []
-        company_facility_links = []
-        
-        # Track seen IDs to prevent duplicate facility entries if raw data has overlap
-        seen_facility_ids = set()
-
-        for record in raw_data:
-            # 1. Extract Basic Info
-            raw_name = record.get("name", "")
-            country = record.get("country_name", "Unknown").strip().title()
-            address = clean_text(record.get("address", ""))
-            
-            # 2. Identify/Generate Facility ID
-            # Ideally use the OAR ID (os_id). If missing, generate a hash.
-            facility_id = record.get("os_id")
-            if not facility_id:
-                # Fallback ID generation
-                f_str = f"{raw_name}|{address}|{country}".encode('utf-8')
-                facility_id = "GEN-" + hashlib.md5(f_str).hexdigest()[:8]
-            
-            if facility_id in seen_facility_ids:
-                continue
-            seen_facility_ids.add(facility_id)
-
-            # 3. Determine Parent Company ID
-            # We apply the EXACT same logic as Phase 2 to ensure the IDs match.
-            cleaned_comp_name = clean_name(raw_name)
-            company_id = generate_company_id(cleaned_comp_name, country)
-            
-            # 4. Prepare Records
-            
-            # Facility Record
-            facilities.append({
-                "facility_id": facility_id,
-                "name": clean_text(raw_name),
-                "address": address,
-                "country": country
-            })
-            
-            # Link Record (Many-to-Many potential, but here it's effectively 1-to-1 or Many-to-1)
-            company_facility_links.append({
-                "company_id": company_id,
-                "facility_id": facility_id
-            })
-
-        # 5. Save Facilities Table
-        logging.info(f"Saving {len(facilities)} facilities...")
-        with open(OUTPUT_FACILITIES, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=["facility_id", "name", "address", "country"])
-            writer.writeheader()
-            writer.writerows(facilities)
-
-        # 6. Save Link Table
-        logging.info(f"Saving {len(company_facility_links)} relational links...")
-        with open(OUTPUT_RELATION, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=["company_id", "facility_id"])
-            writer.writeheader()
-            writer.writerows(company_facility_links)
-            
+        # 1. Extract Basic Info
+        df = pd.DataFrame.from_records(raw_data, columns=["os_id", "name", "address", "country_name"])
+        df["country"] = df["country_name"].fillna("Unknown").astype(object).str.strip().str.title()
+
+        # 2. Determine Parent Company ID
+        # We apply the EXACT same logic as Phase 2 to ensure the IDs match.
+        # Hash each distinct (name, country) pair once, then map back onto the rows.
+        pairs = pd.DataFrame({"clean_name": clean_name(df["name"]), "country": df["country"]})
+        unique_pairs = pairs.drop_duplicates()
+        unique_pairs = unique_pairs.assign(company_id=[
+            generate_company_id(n, c) for n, c in zip(unique_pairs["clean_name"], unique_pairs["country"])
+        ])
+        df["company_id"] = pairs.merge(unique_pairs, on=["clean_name", "country"], how="left")["company_id"].to_numpy()
+
+        # 3. Build and Save Facilities + Link Tables
+        facilities, company_facility_links = build_facilities(df)
+        save_facilities(facilities, company_facility_links)
+
         logging.info("Phase 3 completed successfully.")
 
     except Exception as e:
@@ -119,4 +145,4 @@ def run():
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    run()
\ No newline at end of file
+    run()
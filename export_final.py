@@ -4,12 +4,18 @@ import logging
 import os
 import shutil
 from datetime import datetime
+import pyarrow.parquet as pq
 
 # --- Configuration ---
+# Intermediate Parquet tables, delivered as CSV
+TABLES_TO_EXPORT = {
+    "companies": "cleaned_companies.parquet",
+    "facilities": "cleaned_facilities.parquet",
+    "relations": "company_facilities.parquet",
+}
+
+# Files delivered as-is
 FILES_TO_EXPORT = {
-    "companies": "cleaned_companies.csv",
-    "facilities": "cleaned_facilities.csv",
-    "relations": "company_facilities.csv",
     "ai_results": "ai_duplicates.csv",
     "analytics_img1": "analytics_output/companies_by_country.png",
     "analytics_img2": "analytics_output/facilities_distribution.png"
@@ -18,13 +24,31 @@ FILES_TO_EXPORT = {
 EXPORT_DIR = "final_delivery"
 REPORT_FILE = "summary_report.txt"
 
-def get_file_stats(filename):
-    """Returns the number of records (rows) in a CSV file."""
-    if not os.path.exists(filename):
-        return 0
-    with open(filename, 'r', encoding='utf-8') as f:
-        # Subtract 1 for header
-        return max(0, sum(1 for line in f) - 1)
+def copy_file(src, dest):
+    """
+    Copies src to dest with os.sendfile (kernel-space copy, no user-space
+    buffer), then copies metadata like shutil.copy2. Falls back to
+    shutil.copy2 where sendfile is unavailable or unsupported.
+    """
+    if not hasattr(os, "sendfile"):
+        shutil.copy2(src, dest)
+        return
+
+    try:
+        with open(src, 'rb') as fsrc, open(dest, 'wb') as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+    except OSError:
+        # e.g. filesystems that reject sendfile between regular files
+        shutil.copy2(src, dest)
+        return
+
+    shutil.copystat(src, dest)
 
 def run():
     logging.info("--- Starting Phase 7: Final Export & Reporting ---")
@@ -34,20 +58,41 @@ def run():
         os.makedirs(EXPORT_DIR)
         logging.info(f"Created export directory: {EXPORT_DIR}")
 
-    # 2. Copy Files to Final Destination
+    exported = []
+    row_counts = {}
+
+    # 2a. Convert Parquet Tables to CSV Deliverables
+    for key, filepath in TABLES_TO_EXPORT.items():
+        if os.path.exists(filepath):
+            # e.g. 'cleaned_companies.parquet' -> 'cleaned_companies.csv'
+            basename = os.path.splitext(os.path.basename(filepath))[0] + ".csv"
+            dest = os.path.join(EXPORT_DIR, basename)
+            table = pq.read_table(filepath)
+            # pandas goes through the csv module: minimal quoting and \r\n rows, like csv.DictWriter
+            # (pyarrow's writer quotes every string field)
+            table.to_pandas().to_csv(dest, index=False, lineterminator="\r\n", encoding="utf-8")
+            row_counts[key] = table.num_rows # Reused for the report, no second pass over the data
+            exported.append(basename)
+            logging.info(f"Exported: {basename}")
+        else:
+            logging.warning(f"File missing, skipped export: {filepath}")
+
+    # 2b. Copy Files to Final Destination
     for key, filepath in FILES_TO_EXPORT.items():
         if os.path.exists(filepath):
-            # Extract just the filename (e.g., 'cleaned_companies.csv')
+            # Extract just the filename (e.g., 'ai_duplicates.csv')
             basename = os.path.basename(filepath)
             dest = os.path.join(EXPORT_DIR, basename)
-            shutil.copy2(filepath, dest)
+            copy_file(filepath, dest)
+            exported.append(basename)
             logging.info(f"Exported: {basename}")
         else:
             logging.warning(f"File missing, skipped export: {filepath}")
 
     # 3. Calculate Statistics
-    total_companies = get_file_stats(FILES_TO_EXPORT["companies"])
-    total_facilities = get_file_stats(FILES_TO_EXPORT["facilities"])
+    # Row counts come from the tables loaded for export (0 if a table was missing)
+    total_companies = row_counts.get("companies", 0)
+    total_facilities = row_counts.get("facilities", 0)
     
     avg_facilities = 0
     if total_companies > 0:
@@ -74,9 +119,8 @@ def run():
         "--- EXPORTED FILES ---",
     ]
     
-    for key, filepath in FILES_TO_EXPORT.items():
-        if os.path.exists(filepath):
-             report_content.append(f"- {os.path.basename(filepath)}")
+    for basename in exported:
+        report_content.append(f"- {basename}")
 
     with open(report_path, 'w', encoding='utf-8') as f:
         f.write("\n".join(report_content))
@@ -2,8 +2,7 @@ import logging
 import sys
 import time
 import scrape_oar
-import clean_companies
-import clean_facilities
+import pipeline_clean
 import relational_builder
 import analytics_dashboards
 import ai_module
@@ -32,15 +31,10 @@ def main():
         scrape_oar.run()
         logging.info("Phase 1 completed.")
 
-        # --- PHASE 2: Company Cleaning ---
-        logging.info(">>> PHASE 2: Executing Company Cleaning (clean_companies)...")
-        clean_companies.run()
-        logging.info("Phase 2 completed.")
-
-        # --- PHASE 3: Facility Processing ---
-        logging.info(">>> PHASE 3: Executing Facility Processing (clean_facilities)...")
-        clean_facilities.run()
-        logging.info("Phase 3 completed.")
+        # --- PHASE 2 + 3: Company Cleaning & Facility Processing (single pass) ---
+        logging.info(">>> PHASE 2-3: Executing Company & Facility Cleaning (pipeline_clean)...")
+        pipeline_clean.run()
+        logging.info("Phase 2-3 completed.")
 
         # --- PHASE 4: Relational Structuring ---
         logging.info(">>> PHASE 4: Building Relational Structure (relational_builder)...")
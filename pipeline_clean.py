@@ -0,0 +1,45 @@
+import logging
+import os
+import clean_companies
+import clean_facilities
+
+# --- Configuration ---
+INPUT_FILE = clean_companies.INPUT_FILE
+
+def run():
+    """
+    Fused Phase 2 + 3: parses the raw extract once, cleans every name once,
+    and writes the company, facility and link tables from the same records.
+    """
+    logging.info("--- Starting Phase 2-3: Company & Facility Cleaning (single pass) ---")
+
+    if not os.path.exists(INPUT_FILE):
+        logging.error(f"Input file {INPUT_FILE} not found. Run Phase 1 first.")
+        return
+
+    try:
+        # 1. Load and normalize the raw records once
+        df = clean_companies.prepare_records(clean_companies.load_raw_data())
+        logging.info(f"Loaded {len(df)} raw records.")
+
+        # 2. Company table (deduplicated, IDs generated once per company)
+        companies = clean_companies.build_companies(df)
+        logging.info(f"identified {len(companies)} unique companies from raw data.")
+
+        # 3. Facility + link tables, reusing the company IDs computed above
+        df = df.merge(companies[["clean_name", "country", "company_id"]], on=["clean_name", "country"], how="left")
+        facilities, company_facility_links = clean_facilities.build_facilities(df)
+
+        # 4. Save all three tables
+        clean_companies.save_companies(companies)
+        clean_facilities.save_facilities(facilities, company_facility_links)
+
+        logging.info("Phase 2-3 completed successfully.")
+
+    except Exception as e:
+        logging.error(f"Error in Phase 2-3: {e}")
+        raise
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run()
@@ -1,78 +1,63 @@
-import csv
 import logging
 import os
+import pandas as pd
 
 # --- Configuration ---
-FILE_COMPANIES = "cleaned_companies.csv"
-FILE_FACILITIES = "cleaned_facilities.csv"
-FILE_LINKS = "company_facilities.csv"
+FILE_COMPANIES = "cleaned_companies.parquet"
+FILE_FACILITIES = "cleaned_facilities.parquet"
+FILE_LINKS = "company_facilities.parquet"
 
 def load_ids(filename, id_column):
     """
-    Helper to load a set of IDs from a CSV file.
-    Returns a set of strings.
+    Helper to load the distinct IDs from a Parquet table.
+    Returns a pandas Index of strings (empty if the file is missing or unreadable).
     """
     if not os.path.exists(filename):
         logging.error(f"Missing file: {filename}")
-        return set()
+        return pd.Index([], dtype=object)
     
-    ids = set()
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if id_column in row and row[id_column]:
-                    ids.add(row[id_column])
+        # Column projection: only the ID column is read from disk
+        ids = pd.read_parquet(filename, columns=[id_column])[id_column]
+        return pd.Index(ids.dropna().unique())
     except Exception as e:
         logging.error(f"Error reading {filename}: {e}")
-    return ids
+    return pd.Index([], dtype=object)
 
 def run():
     logging.info("--- Starting Phase 4: Relational Structuring & Validation ---")
     
-    # 1. Load all IDs into sets for O(1) lookup speed
+    # 1. Load all IDs into hash-based indexes for vectorized lookups
     logging.info("Loading IDs from tables...")
     company_ids = load_ids(FILE_COMPANIES, "company_id")
     facility_ids = load_ids(FILE_FACILITIES, "facility_id")
     
-    if not company_ids or not facility_ids:
+    if company_ids.empty or facility_ids.empty:
         logging.error("Critical: Companies or Facilities tables are empty or missing.")
         return
 
     # 2. Validate Links
     logging.info("Validating relationships in link table...")
-    
-    valid_links = 0
-    orphaned_links = 0
-    linked_companies = set()
-    linked_facilities = set()
 
-    if os.path.exists(FILE_LINKS):
-        with open(FILE_LINKS, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                c_id = row.get("company_id")
-                f_id = row.get("facility_id")
-                
-                # Check 1: Does the company exist?
-                c_exists = c_id in company_ids
-                # Check 2: Does the facility exist?
-                f_exists = f_id in facility_ids
-                
-                if c_exists and f_exists:
-                    valid_links += 1
-                    linked_companies.add(c_id)
-                    linked_facilities.add(f_id)
-                else:
-                    orphaned_links += 1
-                    # In a real scenario, you might log the specific broken link here
-    else:
+    if not os.path.exists(FILE_LINKS):
         logging.error(f"Link table {FILE_LINKS} not found!")
         return
 
+    try:
+        links = pd.read_parquet(FILE_LINKS, columns=["company_id", "facility_id"])
+    except Exception as e:
+        logging.error(f"Error reading link table {FILE_LINKS}: {e}")
+        return
+
+    # Check 1: Does the company exist?  Check 2: Does the facility exist?
+    # isin() runs both membership tests as vectorized hash-table lookups
+    valid = links["company_id"].isin(company_ids) & links["facility_id"].isin(facility_ids)
+    valid_links = int(valid.sum())
+    orphaned_links = len(links) - valid_links
+
     # 3. Calculate Orphans (Entities with no links)
-    orphaned_companies = len(company_ids) - len(linked_companies)
-    orphaned_facilities = len(facility_ids) - len(linked_facilities)
+    orphaned_companies = len(company_ids) - links.loc[valid, "company_id"].nunique()
+    orphaned_facilities = len(facility_ids) - links.loc[valid, "facility_id"].nunique()
 
     # 4. Report Results
     logging.info("--- Validation Report ---")
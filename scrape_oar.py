@@ -1,86 +1,202 @@
-import requests
-import json
+import asyncio
+import aiohttp
+from aiolimiter import AsyncLimiter
+import orjson
+import msgspec
+import zstandard as zstd
 import logging
-import time
-import random
 import os
 import csv
+from itertools import islice
+import numpy as np
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # --- Configuration ---
 API_KEY = os.getenv("OAR_API_KEY")
+AUTH_HEADERS = {"Authorization": f"Token {API_KEY}"} if API_KEY else {} # Built once at import
 BASE_URL = "https://opensupplyhub.org/api/facilities/"
 TARGET_COUNTRIES = ["Morocco", "Spain", "Portugal", "Italy", "France", "Greece", "Malta"]
+TARGET_COUNTRIES_SET = frozenset(TARGET_COUNTRIES) # O(1) membership for the CSV filter; keep the list for ordered iteration
 MIN_RECORDS = 3000 # minimum number of records to fetch (set to 10000 for real API)
-OUTPUT_FILE = "raw_oar_data.json"
+OUTPUT_FILE = "raw_oar_data.jsonl.zst" # One JSON record per line, zstd-compressed
+WRITE_BATCH_SIZE = 1000 # Records encoded per write to the extract
+ZSTD_LEVEL = 3 # Fast level; compression runs on background threads (threads=-1: one per core)
 SOURCE_CSV = "source_oar_data.csv"
+CSV_READ_BUFFER = 1 << 20 # 1 MiB reads for the sequential CSV scan (default is 8 KiB)
+MAX_CSV_RECORDS = 50000 # Stop reading the CSV once this many target-country rows are kept
 
 # Set this to False if you have a real API Key and want to hit the live server
 MOCK_MODE = True 
 
-def fetch_from_api():
+# API concurrency: countries are scraped concurrently over one keep-alive connection pool
+MAX_CONCURRENT_REQUESTS = 64 # Upper bound on in-flight requests
+PAGE_SIZE = 50 # Max is often 50 for detail=false
+REQUEST_TIMEOUT = 10 # seconds
+RATE_LIMIT = 50 # Requests allowed per RATE_PERIOD (token bucket, shared by all countries)
+RATE_PERIOD = 10 # seconds
+MAX_RETRIES = 5 # Retries per page on RETRY_STATUSES and network errors
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504}) # Transient statuses worth retrying
+BACKOFF_BASE = 0.5 # seconds, doubled on each retry unless the server sends Retry-After
+
+def retry_delay(response, attempt):
+    """Seconds to wait before a retry: the server's Retry-After if given, else exponential backoff."""
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            pass # HTTP-date form, fall back to backoff
+    return BACKOFF_BASE * (2 ** attempt)
+
+class Facility(msgspec.Struct):
+    """One synthetic facility record (slotted, ~1/3 the size of the equivalent dict)."""
+    os_id: str
+    name: str
+    address: str
+    country_name: str
+    properties: dict
+
+# Encodes Facility structs and plain dicts (CSV rows, API results) alike
+JSON_ENCODER = msgspec.json.Encoder()
+
+async def fetch_page(session, semaphore, limiter, country, page):
+    """
+    Fetches one page of facilities for a country.
+    Returns (results, has_next, total); ([], False, None) if the server refuses the request.
+    total is the API's 'count' of records for the whole query, or None if absent.
+    """
+    params = {
+        "country_name": country,
+        "page": page,
+        "pageSize": PAGE_SIZE
+    }
+
+    for attempt in range(MAX_RETRIES + 1):
+        last_attempt = attempt == MAX_RETRIES
+        try:
+            async with semaphore, limiter:
+                async with session.get(BASE_URL, params=params) as response:
+                    if response.status == 200:
+                        body = await response.read()
+                        break
+                    if response.status not in RETRY_STATUSES or last_attempt:
+                        logging.error(f"Failed to fetch {country} page {page}: {response.status} - {await response.text()}")
+                        return [], False, None
+                    delay = retry_delay(response, attempt)
+                    reason = f"HTTP {response.status}"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Transient network failure (reset, DNS, timeout): retry like a 5xx
+            if last_attempt:
+                logging.error(f"Error scraping {country} page {page}: {type(e).__name__}: {e}")
+                return [], False, None
+            delay = BACKOFF_BASE * (2 ** attempt)
+            reason = type(e).__name__
+
+        # Back off outside the semaphore so other countries keep going
+        logging.warning(f"{reason} on {country} page {page}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    try:
+        return parse_page(body)
+    except orjson.JSONDecodeError as e:
+        logging.error(f"Invalid JSON for {country} page {page}: {e}")
+        return [], False, None
+
+def parse_page(body):
+    """Extracts (results, has_next, total) from a raw page body."""
+    # Every record is kept, so the whole page is materialized anyway; a single
+    # orjson pass beats simdjson's lazy parse + as_list() here (~2x on 50-500 row pages)
+    data = orjson.loads(body)
+    return data.get('results', []), bool(data.get('next')), data.get('count')
+
+async def fetch_and_write(session, semaphore, limiter, country, page, out):
+    """
+    Fetches one page and appends its records to `out`.
+    Returns (records_written, has_next, total) like fetch_page.
+    """
+    results, has_next, total = await fetch_page(session, semaphore, limiter, country, page)
+    if not results:
+        return 0, False, total
+
+    logging.info(f"Fetched {len(results)} records from {country} (Page {page})")
+    return write_records(out, results), has_next, total
+
+async def fetch_country(session, semaphore, limiter, country, out):
+    """
+    Fetches every page of one country, writing each to `out` as it arrives.
+    Returns the number of records written.
+    """
+    logging.info(f"Fetching data for country: {country}")
+    count, has_next, total = await fetch_and_write(session, semaphore, limiter, country, 1, out)
+
+    if has_next and total is not None:
+        # Page 1 carries the total count, so all remaining pages can be requested at once.
+        # Page 1's length is the page size the server actually applied (it may cap PAGE_SIZE).
+        last_page = -(-total // count)
+        pages = await asyncio.gather(
+            *(fetch_and_write(session, semaphore, limiter, country, page, out) for page in range(2, last_page + 1))
+        )
+        count += sum(written for written, _, _ in pages)
+    else:
+        # No count in the response: follow the 'next' links one page at a time
+        page = 1
+        while has_next:
+            page += 1
+            written, has_next, _ = await fetch_and_write(session, semaphore, limiter, country, page, out)
+            count += written
+
+    logging.info(f"Finished {country}: {count} records collected.")
+    return count
+
+async def fetch_all_countries(out):
+    """Scrapes all target countries concurrently over one pooled aiohttp session."""
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    limiter = AsyncLimiter(RATE_LIMIT, RATE_PERIOD) # Permits bursts, enforces the steady-state rate
+    connector = aiohttp.TCPConnector(limit_per_host=MAX_CONCURRENT_REQUESTS, keepalive_timeout=30)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+
+    async with aiohttp.ClientSession(headers=AUTH_HEADERS, connector=connector, timeout=timeout) as session:
+        per_country = await asyncio.gather(
+            *(fetch_country(session, semaphore, limiter, country, out) for country in TARGET_COUNTRIES)
+        )
+
+    return sum(per_country)
+
+def fetch_from_api(out):
     """
     Attempts to fetch real data from the Open Supply Hub API.
-    Requires a valid API Token.
+    Requires a valid API Token. Countries are fetched concurrently
+    (network waits overlap instead of adding up) and pages are streamed
+    to `out` as they arrive, so only one page per country is held in memory.
+    Returns the number of records written.
     """
-    headers = {"Authorization": f"Token {API_KEY}"}
-    all_facilities = []
-    
+    if not API_KEY:
+        # Every request would be rejected; don't bother opening a session
+        logging.error("OAR_API_KEY is not set. Add it to .env or enable MOCK_MODE.")
+        return 0
+
     logging.info(f"Starting API scrape for countries: {TARGET_COUNTRIES}")
+    return asyncio.run(fetch_all_countries(out))
 
-    for country in TARGET_COUNTRIES:
-        logging.info(f"Fetching data for country: {country}")
-        page = 1
-        country_count = 0
-        
-        while True:
-            try:
-                params = {
-                    "country_name": country,
-                    "page": page,
-                    "pageSize": 50  # Max is often 50 for detail=false
-                }
-                
-                response = requests.get(BASE_URL, headers=headers, params=params, timeout=10)
-                
-                if response.status_code != 200:
-                    logging.error(f"Failed to fetch {country} page {page}: {response.status_code} - {response.text}")
-                    break
-                
-                data = response.json()
-                results = data.get('results', [])
-                
-                if not results:
-                    break
-                
-                all_facilities.extend(results)
-                country_count += len(results)
-                logging.info(f"Fetched {len(results)} records from {country} (Page {page})")
-                
-                # Check pagination (next page existence)
-                if not data.get('next'):
-                    break
-                    
-                page += 1
-                time.sleep(0.5) # Respect rate limits
-
-            except Exception as e:
-                logging.error(f"Error scraping {country}: {e}")
-                break
-        
-        logging.info(f"Finished {country}: {country_count} records collected.")
-
-    return all_facilities
+def write_records(out, records):
+    """Appends records to the open extract as JSON Lines; returns how many were written."""
+    count = 0
+    records = iter(records)
+    # One compressor write per batch instead of two per record
+    while batch := [JSON_ENCODER.encode(record) for record in islice(records, WRITE_BATCH_SIZE)]:
+        out.write(b'\n'.join(batch) + b'\n')
+        count += len(batch)
+    return count
 
 def generate_mock_data():
     """
     Generates realistic dummy data to simulate the OAR dataset 
     so the pipeline can be tested without an API key.
+    Records are yielded one at a time.
     """
     logging.info("MOCK_MODE is ON. Generating synthetic data...")
-    fake_data = []
     
     # Text fragments to build realistic names
     prefixes = ["Royal", "Global", "Eco", "Tex", "Fashion", "Blue", "Sustainable", "Urban", "Cotton"]
@@ -98,65 +214,87 @@ def generate_mock_data():
 
     # Generate slightly more than 10,000 to ensure we meet the requirement
     total_records = MIN_RECORDS + 500
-    
-    for i in range(total_records):
-        country = random.choice(TARGET_COUNTRIES)
-        city = random.choice(cities[country])
-        
-        name = f"{random.choice(prefixes)} {random.choice(suffixes)}"
-        # Add some "dirty" data occasionally to test the cleaning phase
-        if random.random() < 0.1:
-            name = name.upper() + "..."
-        
-        facility = {
-            "os_id": f"CN{random.randint(100000, 999999)}",
-            "name": name,
-            "address": f"{random.randint(1, 999)} Industrial Zone, {city}",
-            "country_name": country,
-            "properties": {
-                "description": "Manufacturer of cotton apparel." if random.random() > 0.5 else "Sustainable denim production."
+
+    # Precomputed string tables: each record just indexes into them.
+    # Names hold every prefix/suffix combination, clean first then "dirty"
+    # (upper-cased + "...", to test the cleaning phase).
+    clean_names = [f"{p} {s}" for p in prefixes for s in suffixes]
+    names = clean_names + [name.upper() + "..." for name in clean_names]
+    # Address tails for every city, grouped by country in TARGET_COUNTRIES order
+    address_tails = [f" Industrial Zone, {city}" for country in TARGET_COUNTRIES for city in cities[country]]
+    city_counts = np.array([len(cities[country]) for country in TARGET_COUNTRIES])
+    city_offsets = np.concatenate(([0], np.cumsum(city_counts)[:-1]))
+    descriptions = ["Sustainable denim production.", "Manufacturer of cotton apparel."]
+
+    # Draw every random value up front in a few vector ops instead of ~8 scalar calls per record
+    rng = np.random.default_rng()
+    country_idx = rng.integers(0, len(TARGET_COUNTRIES), total_records)
+    city_idx = city_offsets[country_idx] + (rng.random(total_records) * city_counts[country_idx]).astype(np.int64)
+    dirty = rng.random(total_records) < 0.1
+    name_idx = rng.integers(0, len(clean_names), total_records) + dirty * len(clean_names)
+    os_nums = rng.integers(100000, 1000000, total_records)
+    street_nums = rng.integers(1, 1000, total_records)
+    desc_idx = (rng.random(total_records) > 0.5).astype(np.int64)
+
+    logging.info(f"Generating {total_records} mock records.")
+    yield from (
+        Facility(
+            os_id=f"CN{os_num}",
+            name=names[n],
+            address=f"{street}{address_tails[ci]}",
+            country_name=TARGET_COUNTRIES[c],
+            properties={
+                "description": descriptions[d]
             }
-        }
-        fake_data.append(facility)
-    
-    logging.info(f"Generated {len(fake_data)} mock records.")
-    return fake_data
+        )
+        for c, ci, n, os_num, street, d in zip(
+            country_idx.tolist(), city_idx.tolist(), name_idx.tolist(),
+            os_nums.tolist(), street_nums.tolist(), desc_idx.tolist()
+        )
+    )
 
 
 
 def process_local_csv():
-    """Reads a local CSV, filters by country, and returns the data."""
+    """Reads a local CSV, filters by country, and yields the kept rows as dicts."""
     if not os.path.exists(SOURCE_CSV):
         logging.error(f"Source file '{SOURCE_CSV}' not found.")
         logging.info("Please download the CSV from Open Supply Hub and rename it.")
-        return []
+        return
 
-    extracted_data = []
     logging.info(f"Reading local file: {SOURCE_CSV}...")
 
     try:
-        with open(SOURCE_CSV, 'r', encoding='utf-8', errors='replace') as f:
-            reader = csv.DictReader(f)
-            
+        with open(SOURCE_CSV, 'r', encoding='utf-8', errors='replace', newline='', buffering=CSV_READ_BUFFER) as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+
+            # OAR CSV headers might vary slightly, usually 'country_name' or 'country'
+            country_column = "country_name" if "country_name" in header else "country"
+            if country_column not in header:
+                logging.error(f"No country column found in '{SOURCE_CSV}'.")
+                return
+            ci = header.index(country_column)
+            kept = 0
+
             for row in reader:
-                # OAR CSV headers might vary slightly, usually 'country_name' or 'country'
-                # We try to find the country safely
-                row_country = row.get("country_name") or row.get("country") or ""
-                
+                # Skip blank/truncated lines; rows are only turned into dicts once they pass the filter
+                if len(row) <= ci:
+                    continue
+
                 # specific normalization to match our list
-                if row_country.strip() in TARGET_COUNTRIES:
+                if row[ci].strip() in TARGET_COUNTRIES_SET:
                     # Keep the record
-                    extracted_data.append(row)
-                    
+                    yield dict(zip(header, row))
+                    kept += 1
+
                     # Stop if we have huge amounts of data (e.g. 50k) to save time
-                    if len(extracted_data) >= 50000: break
+                    if kept >= MAX_CSV_RECORDS: break
 
-        logging.info(f"Filtered {len(extracted_data)} facilities from target countries.")
-        return extracted_data
+        logging.info(f"Filtered {kept} facilities from target countries.")
 
     except Exception as e:
         logging.error(f"Failed to read CSV: {e}")
-        return []
 
 
 def run():
@@ -165,29 +303,28 @@ def run():
     """
     logging.info("--- Starting Phase 1: Data Extraction ---")
 
-    if os.path.exists(SOURCE_CSV):
-        data = process_local_csv()
-    else:
-        if MOCK_MODE:
-            data = generate_mock_data()
-        else:
-            data = fetch_from_api()
-        
-    # Validation
-    if len(data) < MIN_RECORDS:
-        logging.warning(f"Extracted {len(data)} records, which is below the target of {MIN_RECORDS}.")
-    else:
-        logging.info(f"Successfully extracted {len(data)} records.")
-
-    # Save to file
+    # The extract is written as it is produced: every source streams records
+    # (CSV rows and mock records are generated, API pages arrive), so no
+    # source is collected into one big list first.
     try:
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
-        logging.info(f"Raw data saved to {OUTPUT_FILE}")
+        with zstd.open(OUTPUT_FILE, 'wb', cctx=zstd.ZstdCompressor(level=ZSTD_LEVEL, threads=-1)) as f:
+            if os.path.exists(SOURCE_CSV):
+                total = write_records(f, process_local_csv())
+            elif MOCK_MODE:
+                total = write_records(f, generate_mock_data())
+            else:
+                total = fetch_from_api(f)
     except Exception as e:
         logging.error(f"Failed to save data: {e}")
         raise
 
+    # Validation
+    if total < MIN_RECORDS:
+        logging.warning(f"Extracted {total} records, which is below the target of {MIN_RECORDS}.")
+    else:
+        logging.info(f"Successfully extracted {total} records.")
+    logging.info(f"Raw data saved to {OUTPUT_FILE}")
+
 if __name__ == "__main__":
     # Setup simple logging if running standalone
     logging.basicConfig(level=logging.INFO)